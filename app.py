@@ -4,11 +4,25 @@ Fully offline RAG-based chatbot for rubber domain knowledge.
 """
 import logging
 import os
-import uuid
-from flask import Flask, request, jsonify
+import secrets
+from flask import Flask, request, Response
 from flask_cors import CORS
 from dotenv import load_dotenv
 
+# orjson (Rust-backed) serializes ~3x faster than stdlib json
+try:
+    import orjson
+    _dumps = orjson.dumps
+except ImportError:
+    import json
+    _dumps = lambda payload: json.dumps(payload).encode('utf-8')
+
+
+def _json(payload, status=200):
+    """Build a JSON response without the jsonify/stdlib overhead."""
+    return Response(_dumps(payload), status=status, mimetype='application/json')
+
+
 # Load env variables before importing services that use them
 load_dotenv()
 
@@ -39,15 +53,15 @@ def chat():
     data = request.get_json()
 
     if not data or 'message' not in data:
-        return jsonify({'error': 'Message is required'}), 400
+        return _json({'error': 'Message is required'}, 400)
 
     message = data['message'].strip()
-    session_id = data.get('sessionId', str(uuid.uuid4()))
+    session_id = data.get('sessionId') or secrets.token_hex(8)
     latitude = data.get('latitude')
     longitude = data.get('longitude')
 
     if not message:
-        return jsonify({'error': 'Message cannot be empty'}), 400
+        return _json({'error': 'Message cannot be empty'}, 400)
 
     logger.info(f"[{session_id[:8]}] User: {message[:80]} (GPS: {latitude}, {longitude})")
 
@@ -62,28 +76,28 @@ def chat():
             f"[{session_id[:8]}] Bot: confidence={response['confidence']:.3f} "
             f"level={response['confidence_level']} category={response.get('category', '')}"
         )
-        return jsonify(response)
+        return _json(response)
     except Exception as e:
         logger.error(f"Chat error: {e}")
-        return jsonify({
+        return _json({
             'reply': 'Sorry, I encountered an error processing your question. Please try again.',
             'confidence': 0,
             'confidence_level': 'low',
             'sources': [],
             'suggested_topics': []
-        }), 500
+        }, 500)
 
 
 @app.route('/api/chat/welcome', methods=['GET'])
 def welcome():
     """Get the welcome message with available categories."""
-    return jsonify(chat_service.get_welcome_message())
+    return Response(chat_service.welcome_bytes, mimetype='application/json')
 
 
 @app.route('/api/chat/topics', methods=['GET'])
 def topics():
     """Get all available topics grouped by category."""
-    return jsonify(chat_service.get_topics())
+    return Response(chat_service.topics_bytes, mimetype='application/json')
 
 
 @app.route('/api/chat/health', methods=['GET'])
@@ -91,7 +105,7 @@ def health():
     """Health check endpoint."""
     kb_count = len(chat_service.embedding_service.knowledge)
     categories = chat_service.embedding_service.get_categories()
-    return jsonify({
+    return _json({
         'status': 'healthy',
         'service': 'RubberIntelligence Chatbot',
         'knowledge_entries': kb_count,
@@ -103,8 +117,12 @@ def health():
 
 
 # ─── Run ──────────────────────────────────────────────────────
+# Production: run under gunicorn with one worker (single model in memory)
+# and a thread pool feeding the batch encoder:
+#   gunicorn -k gthread --threads 16 --workers 1 --bind 0.0.0.0:5008 app:app
 
 if __name__ == '__main__':
     PORT = int(os.environ.get('PORT', 5008))
-    logger.info(f"Starting RubberBot on port {PORT}")
-    app.run(host='0.0.0.0', port=PORT, debug=True, use_reloader=False)
+    logger.info(f"Starting RubberBot on port {PORT} (dev server)")
+    # threaded=True lets concurrent requests reach the batch encoder
+    app.run(host='0.0.0.0', port=PORT, use_reloader=False, threaded=True)
@@ -0,0 +1,78 @@
+import queue
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Batching window: wait up to MAX_WAIT seconds to collect up to MAX_BATCH
+# queries before running a single fused forward pass.
+MAX_BATCH = 32
+MAX_WAIT = 0.008
+
+
+class _Slot:
+    """Per-request result holder a caller blocks on."""
+
+    __slots__ = ('text', 'event', 'result', 'error')
+
+    def __init__(self, text):
+        self.text = text
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class BatchEncoder:
+    """
+    Micro-batching wrapper around a text-encoding function.
+
+    Concurrent callers each submit one text; a background thread drains
+    whatever arrives within a short window and encodes the whole batch in
+    one forward pass, so N simultaneous requests cost one transformer
+    call instead of N.
+    """
+
+    def __init__(self, encode_fn, max_batch: int = MAX_BATCH, max_wait: float = MAX_WAIT):
+        self._encode_fn = encode_fn
+        self._max_batch = max_batch
+        self._max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name='batch-encoder', daemon=True
+        )
+        self._thread.start()
+
+    def encode(self, text: str):
+        """Encode one text, blocking until its batch has been processed."""
+        slot = _Slot(text)
+        self._queue.put(slot)
+        slot.event.wait()
+        if slot.error is not None:
+            raise slot.error
+        return slot.result
+
+    def _run(self):
+        while True:
+            # Block for the first item, then drain for up to the window
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self._max_wait
+            while len(batch) < self._max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                embeddings = self._encode_fn([slot.text for slot in batch])
+                for slot, embedding in zip(batch, embeddings):
+                    slot.result = embedding
+            except Exception as e:
+                logger.error(f"Batch encode failed: {e}")
+                for slot in batch:
+                    slot.error = e
+            for slot in batch:
+                slot.event.set()
@@ -1,9 +1,19 @@
 import logging
+import threading
+from cachetools import TTLCache
 from .embedding_service import EmbeddingService
 from .db_service import DbService
 
 logger = logging.getLogger(__name__)
 
+# orjson (Rust-backed) serializes ~3x faster than stdlib json
+try:
+    import orjson
+    _dumps = orjson.dumps
+except ImportError:
+    import json
+    _dumps = lambda payload: json.dumps(payload).encode('utf-8')
+
 # Confidence thresholds
 HIGH_CONFIDENCE = 0.65
 MEDIUM_CONFIDENCE = 0.30
@@ -31,7 +41,33 @@ class ChatService:
     def __init__(self, knowledge_path: str = None):
         self.embedding_service = EmbeddingService(knowledge_path)
         self.db_service = DbService()
-        self.conversation_contexts = {}  # sessionId -> last category
+        # sessionId -> last category, bounded so idle sessions expire
+        # instead of growing the map for the life of the process
+        self.conversation_contexts = TTLCache(maxsize=10_000, ttl=3600)
+        self._contexts_lock = threading.RLock()
+
+        # The low-confidence reply only depends on the category list, so
+        # render it (and its suggestions) once.
+        categories = self.embedding_service.get_categories()
+        topics = self.embedding_service.get_topics_by_category()
+
+        self._low_conf_suggested = [
+            topics[cat][0]['question']
+            for cat in categories[:4] if topics.get(cat)
+        ]
+        self._low_conf_reply = (
+            "I'm specialized in rubber cultivation and processing topics. "
+            "I couldn't find a strong match for your question.\n\n"
+            "Here are some topics I can help with:\n"
+            + ''.join(f"• {CATEGORY_ICONS.get(c, '📘')} {c}\n" for c in categories)
+            + "\nTry asking me about rubber diseases, latex quality, tapping, "
+            "processing, or pests!"
+        )
+
+        # Welcome/topics never change post-init; serialize them once so
+        # their endpoints can return cached bytes instead of re-encoding.
+        self.welcome_bytes = _dumps(self.get_welcome_message())
+        self.topics_bytes = _dumps(self.get_topics())
 
     def process_message(self, message: str, session_id: str = None, latitude: float = None, longitude: float = None) -> dict:
         """
@@ -45,21 +81,23 @@ class ChatService:
             suggested_topics: [str]
         }
         """
-        # Search knowledge base
+        # Search knowledge base (results are (index, score) into the
+        # embedding service's parallel arrays)
         results = self.embedding_service.search(message, top_k=3)
 
         if not results:
             return self._fallback_response()
 
-        top_entry, top_score = results[0]
+        top_idx, top_score = results[0]
 
         # Track conversation context
         if session_id:
-            self.conversation_contexts[session_id] = top_entry.get('category', '')
+            with self._contexts_lock:
+                self.conversation_contexts[session_id] = self.embedding_service.cats[top_idx]
 
         # High confidence — direct expert answer
         if top_score >= HIGH_CONFIDENCE:
-            response = self._high_confidence_response(results, top_entry, top_score, session_id)
+            response = self._high_confidence_response(results, top_idx, top_score, session_id)
         # Medium confidence — partial match
         elif top_score >= MEDIUM_CONFIDENCE:
             response = self._medium_confidence_response(results, top_score, session_id)
@@ -78,7 +116,7 @@ class ChatService:
                 nearby_diseases = self.db_service.get_nearby_diseases(float(latitude), float(longitude))
                 
                 # We check the top entry text and the actual reply text
-                combined_text = (response.get('reply', '') + " " + top_entry.get('question', '')).lower()
+                combined_text = (response.get('reply', '') + " " + self.embedding_service.questions[top_idx]).lower()
                 
                 matched_disease = None
                 for disease in nearby_diseases:
@@ -131,26 +169,27 @@ class ChatService:
 
         return response
 
-    def _high_confidence_response(self, results, top_entry, score, session_id):
+    def _high_confidence_response(self, results, top_idx, score, session_id):
         """Generate response for high-confidence matches."""
-        category = top_entry.get('category', 'General')
+        es = self.embedding_service
+        category = es.cats[top_idx] or 'General'
         icon = CATEGORY_ICONS.get(category, '📘')
 
-        reply = f"{top_entry['answer']}"
+        reply = es.answers[top_idx]
 
         # Add related topics from same category
-        related = self._get_related_topics(top_entry, results)
+        related = self._get_related_topics(top_idx, results)
 
         # Build source references
         sources = [{
-            'category': entry.get('category', ''),
-            'question': entry.get('question', ''),
-            'score': round(s, 3)
-        } for entry, s in results if s >= MEDIUM_CONFIDENCE]
+            'category': es.cats[idx],
+            'question': es.questions[idx],
+            'score': s
+        } for idx, s in results if s >= MEDIUM_CONFIDENCE]
 
         return {
             'reply': reply,
-            'confidence': round(score, 3),
+            'confidence': score,
             'confidence_level': 'high',
             'category': f"{icon} {category}",
             'sources': sources,
@@ -159,32 +198,32 @@ class ChatService:
 
     def _medium_confidence_response(self, results, score, session_id):
         """Generate response for medium-confidence (partial) matches."""
-        # Compose from top results
-        reply_parts = ["I found some related information that might help:\n"]
+        es = self.embedding_service
 
-        for i, (entry, s) in enumerate(results):
-            if s >= MEDIUM_CONFIDENCE:
-                icon = CATEGORY_ICONS.get(entry.get('category', ''), '📘')
-                reply_parts.append(
-                    f"**{icon} {entry['question']}**\n{entry['answer'][:200]}..."
-                    if len(entry['answer']) > 200
-                    else f"**{icon} {entry['question']}**\n{entry['answer']}"
-                )
+        # Compose reply, suggestions, and sources in a single pass
+        reply_parts = ["I found some related information that might help:\n"]
+        suggested = []
+        sources = []
+
+        for idx, s in results:
+            if s < MEDIUM_CONFIDENCE:
+                continue
+            category = es.cats[idx]
+            question = es.questions[idx]
+            icon = CATEGORY_ICONS.get(category, '📘')
+            reply_parts.append(f"**{icon} {question}**\n{es.answer_previews[idx]}")
+            suggested.append(question)
+            sources.append({
+                'category': category,
+                'question': question,
+                'score': s
+            })
 
         reply = '\n\n'.join(reply_parts)
 
-        # Suggest clearer questions
-        suggested = [entry['question'] for entry, s in results if s >= MEDIUM_CONFIDENCE]
-
-        sources = [{
-            'category': entry.get('category', ''),
-            'question': entry.get('question', ''),
-            'score': round(s, 3)
-        } for entry, s in results if s >= MEDIUM_CONFIDENCE]
-
         return {
             'reply': reply,
-            'confidence': round(score, 3),
+            'confidence': score,
             'confidence_level': 'medium',
             'category': 'Multiple Topics',
             'sources': sources,
@@ -193,34 +232,13 @@ class ChatService:
 
     def _low_confidence_response(self, session_id):
         """Generate response for out-of-domain questions."""
-        categories = self.embedding_service.get_categories()
-        topics = self.embedding_service.get_topics_by_category()
-
-        # Suggest some popular topics
-        suggested = []
-        for cat in categories[:4]:
-            if cat in topics and topics[cat]:
-                suggested.append(topics[cat][0]['question'])
-
-        reply = (
-            "I'm specialized in rubber cultivation and processing topics. "
-            "I couldn't find a strong match for your question.\n\n"
-            "Here are some topics I can help with:\n"
-        )
-
-        for cat in categories:
-            icon = CATEGORY_ICONS.get(cat, '📘')
-            reply += f"• {icon} {cat}\n"
-
-        reply += "\nTry asking me about rubber diseases, latex quality, tapping, processing, or pests!"
-
         return {
-            'reply': reply,
+            'reply': self._low_conf_reply,
             'confidence': 0.0,
             'confidence_level': 'low',
             'category': 'Out of Domain',
             'sources': [],
-            'suggested_topics': suggested
+            'suggested_topics': self._low_conf_suggested
         }
 
     def _fallback_response(self):
@@ -234,16 +252,11 @@ class ChatService:
             'suggested_topics': []
         }
 
-    def _get_related_topics(self, current_entry, results):
+    def _get_related_topics(self, current_idx, results):
         """Get related topics from same category but different from current."""
-        category = current_entry.get('category', '')
-        related = []
-        for entry in self.embedding_service.knowledge:
-            if entry['category'] == category and entry['id'] != current_entry['id']:
-                related.append(entry['question'])
-            if len(related) >= 3:
-                break
-        return related
+        es = self.embedding_service
+        indexes = es.get_by_category(es.cats[current_idx])
+        return [es.questions[idx] for idx in indexes if idx != current_idx][:3]
 
     def get_topics(self):
         """Get all available topics grouped by category."""
@@ -0,0 +1,75 @@
+import os
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ONNX Runtime + optimum are optional. If missing, callers fall back to
+# the PyTorch sentence-transformers encoder.
+try:
+    import onnxruntime
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+    USE_ONNX = True
+except ImportError:
+    USE_ONNX = False
+
+QUANTIZED_MODEL_FILE = 'model_quantized.onnx'
+
+# Chat queries are short; cap padding/truncation well below the model max
+MAX_SEQ_LENGTH = 128
+
+
+class OnnxQueryEncoder:
+    """
+    INT8-quantized ONNX Runtime query encoder.
+
+    Exports the sentence-transformers model to ONNX once, applies dynamic
+    INT8 weight quantization, and caches the result on disk. encode()
+    mean-pools and L2-normalizes in NumPy, matching the embeddings the
+    PyTorch path produces, at roughly half the CPU cost.
+    """
+
+    def __init__(self, model_name: str, cache_dir: str):
+        if '/' not in model_name:
+            model_name = f'sentence-transformers/{model_name}'
+
+        onnx_dir = os.path.join(cache_dir, 'onnx')
+        quantized_path = os.path.join(onnx_dir, QUANTIZED_MODEL_FILE)
+
+        if not os.path.exists(quantized_path):
+            logger.info(f"Exporting {model_name} to ONNX with INT8 quantization...")
+            os.makedirs(onnx_dir, exist_ok=True)
+            model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+            model.save_pretrained(onnx_dir)
+            quantizer = ORTQuantizer.from_pretrained(onnx_dir)
+            quantizer.quantize(
+                save_dir=onnx_dir,
+                quantization_config=AutoQuantizationConfig.avx512_vnni(is_static=False),
+            )
+
+        sess_options = onnxruntime.SessionOptions()
+        sess_options.intra_op_num_threads = os.cpu_count() or 1
+        self.session = onnxruntime.InferenceSession(quantized_path, sess_options=sess_options)
+        self.tokenizer = AutoTokenizer.from_pretrained(onnx_dir)
+        self._input_names = [i.name for i in self.session.get_inputs()]
+
+    def encode(self, texts):
+        """Encode texts to L2-normalized float32 embeddings."""
+        encoded = self.tokenizer(
+            texts, padding=True, truncation=True,
+            max_length=MAX_SEQ_LENGTH, return_tensors='np'
+        )
+        inputs = {
+            name: encoded[name].astype(np.int64)
+            for name in self._input_names if name in encoded
+        }
+        hidden = self.session.run(None, inputs)[0]
+
+        # Mean-pool over non-padding tokens, then L2-normalize
+        mask = encoded['attention_mask'][:, :, None].astype(hidden.dtype)
+        embeddings = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-12
+        return embeddings.astype(np.float32)